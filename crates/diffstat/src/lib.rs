@@ -0,0 +1,208 @@
+/*
+ * SPDX-License-Identifier: MIT
+ * Copyright (c) 2020 Kevin B. Hendricks, Stratford Ontario Canada
+ * All rights reserved.
+ *
+ * Native implementation of the patch parser in dulwich/contrib/diffstat.py;
+ * see that file for the full license text.
+ */
+
+use memchr::memchr;
+
+use pyo3::buffer::PyBuffer;
+use pyo3::exceptions::PyValueError;
+use pyo3::prelude::*;
+use pyo3::types::{PyBytes, PyTuple};
+
+const GIT_HEADER_START: &[u8] = b"diff --git ";
+const GIT_BINARY_START: &[u8] = b"Binary file";
+const GIT_RENAMEFROM_START: &[u8] = b"rename from";
+const GIT_RENAMETO_START: &[u8] = b"rename to";
+const GIT_CHUNK_START: &[u8] = b"@@";
+
+struct FileStat {
+    name: Vec<u8>,
+    /// Destination of a rename, in which case name is the source
+    rename_to: Option<Vec<u8>>,
+    binary: bool,
+    added: usize,
+    deleted: usize,
+}
+
+/// Strip any trailing line ending characters.
+fn trim_eol(mut s: &[u8]) -> &[u8] {
+    while let Some((b'\r' | b'\n', rest)) = s.split_last() {
+        s = rest;
+    }
+    s
+}
+
+/// Extract the destination filename from a "diff --git" line.
+///
+/// Mirrors `_git_header_name`, including the prefixes used when
+/// diff.mnemonicPrefix is set and the swapped ones from `git diff -R`,
+/// but also returns None for lines that are not "diff --git" lines.
+fn git_header_name(line: &[u8]) -> Option<&[u8]> {
+    if !line.starts_with(GIT_HEADER_START) {
+        return None;
+    }
+    let dst_prefixes: &[&[u8]] = match line.get(11..13)? {
+        b"a/" => &[b" b/"],
+        b"b/" => &[b" a/"],
+        b"c/" => &[b" w/", b" i/"],
+        b"i/" => &[b" w/", b" c/"],
+        b"o/" => &[b" w/"],
+        b"w/" => &[b" i/", b" c/", b" o/"],
+        b"1/" => &[b" 2/"],
+        b"2/" => &[b" 1/"],
+        _ => return None,
+    };
+    for prefix in dst_prefixes {
+        if let Some(idx) = line[13..].windows(3).rposition(|w| w == *prefix) {
+            return Some(trim_eol(&line[13 + idx + 3..]));
+        }
+    }
+    None
+}
+
+/// Parse a git style diff, line by line.
+///
+/// This is the same state machine as `_parse_patch`, run over the lines
+/// of `buf` without copying them out.
+fn parse_patch(buf: &[u8]) -> Vec<FileStat> {
+    let mut files = Vec::new();
+    let mut current: Option<FileStat> = None;
+    let mut in_patch_chunk = false;
+    let mut in_git_header = false;
+    let mut pos = 0;
+    loop {
+        let eol = memchr(b'\n', &buf[pos..]).map_or(buf.len(), |i| pos + i);
+        let line = &buf[pos..eol];
+        match line.first() {
+            Some(b' ') => {}
+            Some(b'+') => {
+                if in_patch_chunk {
+                    if let Some(file) = current.as_mut() {
+                        file.added += 1;
+                    }
+                }
+            }
+            Some(b'-') => {
+                if in_patch_chunk {
+                    if let Some(file) = current.as_mut() {
+                        file.deleted += 1;
+                    }
+                }
+            }
+            Some(b'@')
+                if line.starts_with(GIT_CHUNK_START) && (in_patch_chunk || in_git_header) =>
+            {
+                in_patch_chunk = true;
+                in_git_header = false;
+            }
+            _ => {
+                if let Some(name) = git_header_name(line) {
+                    files.extend(current.take());
+                    current = Some(FileStat {
+                        name: name.to_vec(),
+                        rename_to: None,
+                        binary: false,
+                        added: 0,
+                        deleted: 0,
+                    });
+                    in_git_header = true;
+                    in_patch_chunk = false;
+                } else if in_git_header {
+                    // in_git_header and in_patch_chunk are never both set
+                    if let Some(file) = current.as_mut() {
+                        if line.starts_with(GIT_BINARY_START) {
+                            file.binary = true;
+                            in_git_header = false;
+                        } else if line.starts_with(GIT_RENAMEFROM_START) {
+                            file.name = trim_eol(line.get(12..).unwrap_or_default()).to_vec();
+                            file.rename_to = None;
+                        } else if line.starts_with(GIT_RENAMETO_START) {
+                            file.rename_to =
+                                Some(trim_eol(line.get(10..).unwrap_or_default()).to_vec());
+                        }
+                    }
+                } else {
+                    in_patch_chunk = false;
+                }
+            }
+        }
+        if eol == buf.len() {
+            break;
+        }
+        pos = eol + 1;
+    }
+    files.extend(current);
+    files
+}
+
+/// Parse a git style diff or patch held in a single buffer.
+///
+/// Accepts any object exporting a contiguous byte buffer; diffstat()
+/// passes bytes, bytearray and mmap objects.
+///
+/// # Returns: A tuple (names, is_binary, insertions, deletions, namelen,
+///   maxdiff). The first four are lists with one entry per file, where
+///   renamed files are named by a (source, destination) tuple. namelen is
+///   the length of the longest name as shown, and maxdiff the largest
+///   number of changes to a single file.
+#[pyfunction]
+#[allow(clippy::type_complexity)]
+fn _parse_patch_buffer<'py>(
+    py: Python<'py>,
+    buf: PyBuffer<u8>,
+) -> PyResult<(
+    Vec<Bound<'py, PyAny>>,
+    Vec<bool>,
+    Vec<usize>,
+    Vec<usize>,
+    usize,
+    usize,
+)> {
+    if !buf.is_c_contiguous() {
+        return Err(PyValueError::new_err("buffer must be contiguous"));
+    }
+    let data: &[u8] = if buf.len_bytes() == 0 {
+        &[]
+    } else {
+        // SAFETY: the buffer is contiguous, and the export held by `buf`
+        // keeps the memory alive and unresized until it is dropped
+        unsafe { std::slice::from_raw_parts(buf.buf_ptr() as *const u8, buf.len_bytes()) }
+    };
+    let files = parse_patch(data);
+    let mut names = Vec::with_capacity(files.len());
+    let mut namelen: usize = 0;
+    let mut maxdiff: usize = 0;
+    for file in &files {
+        let name = PyBytes::new(py, &file.name);
+        names.push(match &file.rename_to {
+            Some(rename_to) => {
+                namelen = namelen.max(file.name.len() + 4 + rename_to.len());
+                PyTuple::new(py, [name, PyBytes::new(py, rename_to)])?.into_any()
+            }
+            None => {
+                namelen = namelen.max(file.name.len());
+                name.into_any()
+            }
+        });
+        maxdiff = maxdiff.max(file.added + file.deleted);
+    }
+    Ok((
+        names,
+        files.iter().map(|f| f.binary).collect(),
+        files.iter().map(|f| f.added).collect(),
+        files.iter().map(|f| f.deleted).collect(),
+        namelen,
+        maxdiff,
+    ))
+}
+
+#[pymodule]
+fn _diffstat(_py: Python, m: &Bound<PyModule>) -> PyResult<()> {
+    m.add_function(wrap_pyfunction!(_parse_patch_buffer, m)?)?;
+    Ok(())
+}
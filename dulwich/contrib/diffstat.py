@@ -33,23 +33,81 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import mmap
 import re
 import sys
-from typing import Optional
+from collections.abc import Iterable
+from typing import Optional, Union
 
 # only needs to detect git style diffs as this is for
 # use with dulwich
 
-_git_header_name = re.compile(rb"diff --git a/(.*) b/(.*)")
-
-_GIT_HEADER_START = b"diff --git a/"
+_GIT_HEADER_START = b"diff --git "
 _GIT_BINARY_START = b"Binary file"
 _GIT_RENAMEFROM_START = b"rename from"
 _GIT_RENAMETO_START = b"rename to"
 _GIT_CHUNK_START = b"@@"
-_GIT_ADDED_START = b"+"
-_GIT_DELETED_START = b"-"
-_GIT_UNCHANGED_START = b" "
+
+# extended header lines of interest; each starts with a different byte
+# except for the renames, which differ at index 7
+_GIT_HEADER_KEYWORDS = (_GIT_BINARY_START, _GIT_RENAMEFROM_START, _GIT_RENAMETO_START)
+
+# start of the first line that is not part of a run of hunks; a line
+# consisting of just "@" at the very end of the input is not matched,
+# but that does not affect the counts
+_GIT_CHUNK_END = re.compile(rb"\n(?:[^ +\-@]|@[^@])")
+
+# source prefix => possible destination prefixes, including the
+# ones used when diff.mnemonicPrefix is set and the swapped pairs
+# written by git diff -R
+_GIT_HEADER_PREFIXES = {
+    b"a/": (b" b/",),
+    b"b/": (b" a/",),
+    b"c/": (b" w/", b" i/"),
+    b"i/": (b" w/", b" c/"),
+    b"o/": (b" w/",),
+    b"w/": (b" i/", b" c/", b" o/"),
+    b"1/": (b" 2/",),
+    b"2/": (b" 1/",),
+}
+
+# bytes of a mapped diff copied out at a time when counting its hunks
+_MMAP_COUNT_WINDOW = 1 << 20
+
+# the raw diff types accepted by the buffer parser
+_Buffer = Union[bytes, bytearray, mmap.mmap]
+
+# a filename, or a (source, destination) pair for renames
+_FileName = Union[bytes, tuple[bytes, bytes]]
+
+# names, is_binary, insertions, deletions, namelen, maxdiff
+_PatchStats = tuple[list[_FileName], list[bool], list[int], list[int], int, int]
+
+
+def _filename_len(name: _FileName) -> int:
+    """Return the length of a filename as it is shown by diffstat."""
+    if isinstance(name, tuple):
+        return len(name[0]) + 4 + len(name[1])
+    return len(name)
+
+
+def _git_header_name(line: bytes) -> Optional[bytes]:
+    """Extract the destination filename from a ``diff --git`` line.
+
+    Args:
+      line: header line, starting with ``diff --git ``
+    Returns: the filename, or None if the line can not be parsed
+    """
+    # bytes() so that bytearray lines can be looked up too
+    dst_prefixes = _GIT_HEADER_PREFIXES.get(bytes(line[11:13]))
+    if dst_prefixes is None:
+        return None
+    for prefix in dst_prefixes:
+        idx = line.rfind(prefix, 13)
+        if idx != -1:
+            return line[idx + 3 :].rstrip(b"\r\n")
+    return None
+
 
 # emulate original full Patch class by just extracting
 # filename and minimal chunk added/deleted information to
@@ -57,136 +115,275 @@ _GIT_UNCHANGED_START = b" "
 
 
 def _parse_patch(
-    lines: list[bytes],
-) -> tuple[list[bytes], list[bool], list[tuple[int, int]]]:
+    lines: Iterable[bytes],
+) -> _PatchStats:
     """Parse a git style diff or patch to generate diff stats.
 
     Args:
-      lines: list of byte string lines from the diff to be parsed
-    Returns: A tuple (names, is_binary, counts) of three lists
+      lines: iterable of byte string lines from the diff to be parsed;
+             they are consumed in a single pass
+    Returns: A tuple (names, is_binary, insertions, deletions, namelen,
+      maxdiff). The first four are lists with one entry per file, where
+      renamed files are named by a (source, destination) tuple. namelen
+      is the length of the longest name as shown, and maxdiff the largest
+      number of changes to a single file.
     """
     names = []
     nametypes = []
-    counts = []
+    insert = []
+    delete = []
     in_patch_chunk = in_git_header = binaryfile = False
-    currentfile: Optional[bytes] = None
+    currentfile: Optional[_FileName] = None
     added = deleted = 0
+    namelen = maxdiff = 0
     for line in lines:
-        if line.startswith(_GIT_HEADER_START):
+        # dispatch on the first byte, checking the most common line
+        # types (context, added, deleted) first. The byte is compared as
+        # an int against literals, avoiding a slice and a global lookup
+        c = line[0] if line else -1
+        if c == 0x20:  # b" "
+            continue
+        if c == 0x2B:  # b"+"
+            if in_patch_chunk:
+                added += 1
+        elif c == 0x2D:  # b"-"
+            if in_patch_chunk:
+                deleted += 1
+        elif (
+            c == 0x40  # b"@"
+            and line.startswith(_GIT_CHUNK_START)
+            and (in_patch_chunk or in_git_header)
+        ):
+            in_patch_chunk = True
+            in_git_header = False
+        elif (
+            c == 0x64  # b"d"
+            and line.startswith(_GIT_HEADER_START)
+            and (name := _git_header_name(line)) is not None
+        ):
             if currentfile is not None:
                 names.append(currentfile)
                 nametypes.append(binaryfile)
-                counts.append((added, deleted))
-            m = _git_header_name.search(line)
-            assert m
-            currentfile = m.group(2)
+                insert.append(added)
+                delete.append(deleted)
+                namelen = max(namelen, _filename_len(currentfile))
+                maxdiff = max(maxdiff, added + deleted)
+            currentfile = name
             binaryfile = False
             added = deleted = 0
             in_git_header = True
             in_patch_chunk = False
-        elif line.startswith(_GIT_BINARY_START) and in_git_header:
-            binaryfile = True
-            in_git_header = False
-        elif line.startswith(_GIT_RENAMEFROM_START) and in_git_header:
-            currentfile = line[12:]
-        elif line.startswith(_GIT_RENAMETO_START) and in_git_header:
-            assert currentfile
-            currentfile += b" => %s" % line[10:]
-        elif line.startswith(_GIT_CHUNK_START) and (in_patch_chunk or in_git_header):
-            in_patch_chunk = True
-            in_git_header = False
-        elif line.startswith(_GIT_ADDED_START) and in_patch_chunk:
-            added += 1
-        elif line.startswith(_GIT_DELETED_START) and in_patch_chunk:
-            deleted += 1
-        elif not line.startswith(_GIT_UNCHANGED_START) and in_patch_chunk:
+        elif in_git_header:
+            # in_git_header and in_patch_chunk are never both set
+            if line.startswith(_GIT_HEADER_KEYWORDS):
+                if c == 0x42:  # b"B"
+                    binaryfile = True
+                    in_git_header = False
+                elif line[7:8] == b"f":
+                    currentfile = line[12:].rstrip(b"\r\n")
+                else:
+                    if isinstance(currentfile, tuple):
+                        currentfile = currentfile[0]
+                    # a git header always names the file first
+                    if currentfile is not None:
+                        currentfile = (currentfile, line[10:].rstrip(b"\r\n"))
+        elif in_patch_chunk:
             in_patch_chunk = False
     # handle end of input
     if currentfile is not None:
         names.append(currentfile)
         nametypes.append(binaryfile)
-        counts.append((added, deleted))
-    return names, nametypes, counts
+        insert.append(added)
+        delete.append(deleted)
+        namelen = max(namelen, _filename_len(currentfile))
+        maxdiff = max(maxdiff, added + deleted)
+    return names, nametypes, insert, delete, namelen, maxdiff
+
+
+def _find_git_header(buf: _Buffer, pos: int) -> tuple[int, Optional[bytes]]:
+    """Find the next parseable ``diff --git`` line in a buffer.
+
+    Args:
+      buf: the raw diff
+      pos: offset of the line to start searching at
+    Returns: A tuple (end, name) with the offset of the end of the header
+      line and the filename, or (-1, None) if there are no more headers
+    """
+    while True:
+        if buf[pos : pos + len(_GIT_HEADER_START)] == _GIT_HEADER_START:
+            nl = buf.find(b"\n", pos)
+            if nl == -1:
+                nl = len(buf)
+            name = _git_header_name(bytes(buf[pos:nl]))
+            if name is not None:
+                return nl, name
+        pos = buf.find(b"\n" + _GIT_HEADER_START, pos)
+        if pos == -1:
+            return -1, None
+        pos += 1
+
+
+def _parse_patch_buffer(
+    buf: _Buffer,
+) -> _PatchStats:
+    """Parse a git style diff or patch held in a single buffer.
+
+    This gives the same result as running _parse_patch on the lines of
+    ``buf``, but only the header lines are inspected one at a time; the
+    lines of each run of hunks are located and counted in C.
+
+    Args:
+      buf: the raw diff to be parsed, as bytes, bytearray or mmap
+    Returns: A tuple (names, is_binary, insertions, deletions, namelen,
+      maxdiff). The first four are lists with one entry per file, where
+      renamed files are named by a (source, destination) tuple. namelen
+      is the length of the longest name as shown, and maxdiff the largest
+      number of changes to a single file.
+    """
+    names = []
+    nametypes = []
+    insert = []
+    delete = []
+    namelen = maxdiff = 0
+    end = len(buf)
+    currentfile: Optional[_FileName]
+    nl, currentfile = _find_git_header(buf, 0)
+    while currentfile is not None:
+        binaryfile = False
+        added = deleted = 0
+        nextfile = None
+        pos = nl + 1
+        while pos <= end:
+            nl = buf.find(b"\n", pos)
+            if nl == -1:
+                nl = end
+            # only (short) header lines are copied out of the buffer; bytes()
+            # is free for bytes and mmap slices and converts bytearray ones
+            line = bytes(buf[pos:nl])
+            c = line[0] if line else -1
+            if c == 0x40 and line.startswith(_GIT_CHUNK_START):  # b"@"
+                m = _GIT_CHUNK_END.search(buf, nl)
+                chunkend = end if m is None else m.start()
+                if isinstance(buf, mmap.mmap):
+                    # mmap has no count(), so copy the run of hunks out one
+                    # window at a time. Windows overlap by a byte so that a
+                    # line start split across two of them is still counted
+                    start = nl
+                    while True:
+                        stop = min(start + _MMAP_COUNT_WINDOW, chunkend)
+                        window = buf[start:stop]
+                        added += window.count(b"\n+")
+                        deleted += window.count(b"\n-")
+                        if stop == chunkend:
+                            break
+                        start = stop - 1
+                else:
+                    added = buf.count(b"\n+", nl, chunkend)
+                    deleted = buf.count(b"\n-", nl, chunkend)
+                nl, nextfile = _find_git_header(buf, chunkend + 1)
+                break
+            elif (
+                c == 0x64  # b"d"
+                and line.startswith(_GIT_HEADER_START)
+                and (nextfile := _git_header_name(line)) is not None
+            ):
+                break
+            elif line.startswith(_GIT_HEADER_KEYWORDS):
+                if c == 0x42:  # b"B"
+                    binaryfile = True
+                    nl, nextfile = _find_git_header(buf, nl + 1)
+                    break
+                elif line[7:8] == b"f":
+                    currentfile = line[12:].rstrip(b"\r")
+                else:
+                    if isinstance(currentfile, tuple):
+                        currentfile = currentfile[0]
+                    currentfile = (currentfile, line[10:].rstrip(b"\r"))
+            pos = nl + 1
+        names.append(currentfile)
+        nametypes.append(binaryfile)
+        insert.append(added)
+        delete.append(deleted)
+        namelen = max(namelen, _filename_len(currentfile))
+        maxdiff = max(maxdiff, added + deleted)
+        currentfile = nextfile
+    return names, nametypes, insert, delete, namelen, maxdiff
+
+
+# Hold on to the pure-python implementation for testing
+_parse_patch_buffer_py = _parse_patch_buffer
+try:
+    from dulwich._diffstat import _parse_patch_buffer as _parse_patch_buffer_rs
+except ImportError:
+    _parse_patch_buffer_rs = None
+else:
+    # The Rust version takes any contiguous buffer, mmap included
+    _parse_patch_buffer = _parse_patch_buffer_rs
 
 
 # note must all done using bytes not string because on linux filenames
 # may not be encodable even to utf-8
-def diffstat(lines: list[bytes], max_width: int = 80) -> bytes:
+def diffstat(lines: Union[_Buffer, Iterable[bytes]], max_width: int = 80) -> bytes:
     """Generate summary statistics from a git style diff ala
        (git diff tag1 tag2 --stat).
 
     Args:
-      lines: list of byte string "lines" from the diff to be parsed
+      lines: iterable of byte string "lines" from the diff to be parsed,
+             or the raw diff as a single buffer (bytes, bytearray or mmap)
       max_width: maximum line length for generating the summary
                  statistics (default 80)
     Returns: A byte string that lists the changed files with change
              counts and histogram.
     """
-    names, nametypes, counts = _parse_patch(lines)
-    insert = []
-    delete = []
-    namelen = 0
-    maxdiff = 0  # max changes for any file used for histogram width calc
-    for i, filename in enumerate(names):
-        i, d = counts[i]
-        insert.append(i)
-        delete.append(d)
-        namelen = max(namelen, len(filename))
-        maxdiff = max(maxdiff, i + d)
-    output = b""
+    # maxdiff is the max changes for any file used for histogram width calc
+    if isinstance(lines, (bytes, bytearray, mmap.mmap)):
+        stats = _parse_patch_buffer(lines)
+    else:
+        stats = _parse_patch(lines)
+    filenames, nametypes, insert, delete, namelen, maxdiff = stats
+    # renames are only formatted here, once per file
+    names = [b"%s => %s" % n if isinstance(n, tuple) else n for n in filenames]
+    insert_sum = sum(insert)
+    delete_sum = sum(delete)
+    output = []
     statlen = len(str(maxdiff))  # stats column width
+    # %-19s | %-4d %s
+    # note b'%d' % namelen is not supported until Python 3.5
+    # To convert an int to a format width specifier for byte
+    # strings use str(namelen).encode('ascii')
+    namewidth = str(namelen).encode("ascii")
+    # the widths are fixed for the whole call, so build the row formats
+    # once; the change count is rendered by %d rather than str().encode()
+    format = b" %-" + namewidth + b"s | %" + str(statlen).encode("ascii") + b"d %s\n"
+    binformat = b" %-" + namewidth + b"s | %s\n"
+    # -- calculating histogram width --
+    width = len(format % (b"", 0, b""))
+    histwidth = max(2, max_width - width)
+    # every histogram is a slice of this, centered on the +/- boundary
+    bars = b"+" * histwidth + b"-" * histwidth
     for i, n in enumerate(names):
         binaryfile = nametypes[i]
-        # %-19s | %-4d %s
-        # note b'%d' % namelen is not supported until Python 3.5
-        # To convert an int to a format width specifier for byte
-        # strings use str(namelen).encode('ascii')
-        format = (
-            b" %-"
-            + str(namelen).encode("ascii")
-            + b"s | %"
-            + str(statlen).encode("ascii")
-            + b"s %s\n"
-        )
-        binformat = b" %-" + str(namelen).encode("ascii") + b"s | %s\n"
         if not binaryfile:
-            hist = b""
-            # -- calculating histogram --
-            width = len(format % (b"", b"", b""))
-            histwidth = max(2, max_width - width)
             if maxdiff < histwidth:
-                hist = b"+" * insert[i] + b"-" * delete[i]
+                iwidth = insert[i]
+                dwidth = delete[i]
             else:
                 iratio = (float(insert[i]) / maxdiff) * histwidth
                 dratio = (float(delete[i]) / maxdiff) * histwidth
-                iwidth = dwidth = 0
                 # make sure every entry that had actual insertions gets
-                # at least one +
-                if insert[i] > 0:
-                    iwidth = int(iratio)
-                    if iwidth == 0 and 0 < iratio < 1:
-                        iwidth = 1
-                # make sure every entry that had actual deletions gets
-                # at least one -
-                if delete[i] > 0:
-                    dwidth = int(dratio)
-                    if dwidth == 0 and 0 < dratio < 1:
-                        dwidth = 1
-                hist = b"+" * int(iwidth) + b"-" * int(dwidth)
-            output += format % (
-                bytes(names[i]),
-                str(insert[i] + delete[i]).encode("ascii"),
-                hist,
-            )
+                # at least one +, and likewise for deletions and -
+                iwidth = max(int(iratio), min(insert[i], 1))
+                dwidth = max(int(dratio), min(delete[i], 1))
+            hist = bars[histwidth - iwidth : histwidth + dwidth]
+            output.append(format % (names[i], insert[i] + delete[i], hist))
         else:
-            output += binformat % (bytes(names[i]), b"Bin")
+            output.append(binformat % (names[i], b"Bin"))
 
-    output += b" %d files changed, %d insertions(+), %d deletions(-)" % (
-        len(names),
-        sum(insert),
-        sum(delete),
+    output.append(
+        b" %d files changed, %d insertions(+), %d deletions(-)"
+        % (len(names), insert_sum, delete_sum)
     )
-    return output
+    return b"".join(output)
 
 
 def main() -> int:
@@ -194,11 +391,15 @@ def main() -> int:
     # allow diffstat.py to also be used from the command line
     if len(sys.argv) > 1:
         diffpath = argv[1]
-        data = b""
         with open(diffpath, "rb") as f:
-            data = f.read()
-        lines = data.split(b"\n")
-        result = diffstat(lines)
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                # empty files and pipes can not be mapped
+                result = diffstat(f.read())
+            else:
+                with data:
+                    result = diffstat(data)
         print(result.decode("utf-8"))
         return 0
 
@@ -68,6 +68,12 @@ else:
                 binding=Binding.PyO3,
                 optional=optional,
             ),
+            RustExtension(
+                "dulwich._diffstat",
+                "crates/diffstat/Cargo.toml",
+                binding=Binding.PyO3,
+                optional=optional,
+            ),
         ]
 
 
@@ -5,15 +5,21 @@
 
 """Tests for dulwich.contrib.diffstat."""
 
+import mmap
 import os
 import tempfile
 import unittest
+from unittest.mock import patch
 
+from dulwich.contrib import diffstat as diffstat_module
 from dulwich.contrib.diffstat import (
     _parse_patch,
+    _parse_patch_buffer_py,
+    _parse_patch_buffer_rs,
     diffstat,
     main,
 )
+from dulwich.tests.utils import ext_functest_builder, functest_builder
 
 
 class ParsePatchTests(unittest.TestCase):
@@ -21,10 +27,12 @@ class ParsePatchTests(unittest.TestCase):
 
     def test_empty_input(self):
         """Test parsing an empty list of lines."""
-        names, nametypes, counts = _parse_patch([])
+        names, nametypes, insert, delete, namelen, maxdiff = _parse_patch([])
         self.assertEqual(names, [])
         self.assertEqual(nametypes, [])
-        self.assertEqual(counts, [])
+        self.assertEqual(insert, [])
+        self.assertEqual(delete, [])
+        self.assertEqual((namelen, maxdiff), (0, 0))
 
     def test_basic_git_diff(self):
         """Test parsing a basic git diff with additions and deletions."""
@@ -42,10 +50,13 @@ class ParsePatchTests(unittest.TestCase):
             b"+third added line",
             b" unchanged line",
         ]
-        names, nametypes, counts = _parse_patch(diff)
+        names, nametypes, insert, delete, namelen, maxdiff = _parse_patch(diff)
         self.assertEqual(names, [b"file.txt"])
         self.assertEqual(nametypes, [False])  # Not a binary file
-        self.assertEqual(counts, [(3, 2)])  # 3 additions, 2 deletions
+        # 3 additions, 2 deletions
+        self.assertEqual(insert, [3])
+        self.assertEqual(delete, [2])
+        self.assertEqual((namelen, maxdiff), (8, 5))
 
     def test_chunk_ending_with_nonstandard_line(self):
         """Test parsing a git diff where a chunk ends with a non-standard line.
@@ -73,12 +84,12 @@ class ParsePatchTests(unittest.TestCase):
             b"+added in file2",
             b" another unchanged in file2",
         ]
-        names, nametypes, counts = _parse_patch(diff)
+        names, nametypes, insert, delete, namelen, maxdiff = _parse_patch(diff)
         self.assertEqual(names, [b"file.txt", b"file2.txt"])
         self.assertEqual(nametypes, [False, False])
-        self.assertEqual(
-            counts, [(1, 1), (1, 0)]
-        )  # file1: 1 add, 1 delete; file2: 1 add, 0 delete
+        # file1: 1 add, 1 delete; file2: 1 add, 0 delete
+        self.assertEqual(insert, [1, 1])
+        self.assertEqual(delete, [1, 0])
 
     def test_binary_files(self):
         """Test parsing a git diff with binary files."""
@@ -87,10 +98,12 @@ class ParsePatchTests(unittest.TestCase):
             b"index 1234567..abcdefg 100644",
             b"Binary files a/image.png and b/image.png differ",
         ]
-        names, nametypes, counts = _parse_patch(diff)
+        names, nametypes, insert, delete, namelen, maxdiff = _parse_patch(diff)
         self.assertEqual(names, [b"image.png"])
         self.assertEqual(nametypes, [True])  # Is a binary file
-        self.assertEqual(counts, [(0, 0)])  # No additions/deletions counted
+        # No additions/deletions counted
+        self.assertEqual(insert, [0])
+        self.assertEqual(delete, [0])
 
     def test_renamed_file(self):
         """Test parsing a git diff with a renamed file."""
@@ -108,11 +121,66 @@ class ParsePatchTests(unittest.TestCase):
             b"+added line",
             b" third unchanged line",
         ]
-        names, nametypes, counts = _parse_patch(diff)
+        names, nametypes, insert, delete, namelen, maxdiff = _parse_patch(diff)
         # The name should include both old and new names
-        self.assertEqual(names, [b"oldname.txt => newname.txt"])
+        self.assertEqual(names, [(b"oldname.txt", b"newname.txt")])
         self.assertEqual(nametypes, [False])  # Not a binary file
-        self.assertEqual(counts, [(1, 0)])  # 1 addition, 0 deletions
+        # 1 addition, 0 deletions
+        self.assertEqual(insert, [1])
+        self.assertEqual(delete, [0])
+        self.assertEqual((namelen, maxdiff), (26, 1))
+
+    def test_mnemonic_prefix(self):
+        """Test parsing a git diff generated with diff.mnemonicPrefix."""
+        diff = [
+            b"diff --git i/file.txt w/file.txt",
+            b"index 1234567..abcdefg 100644",
+            b"--- i/file.txt",
+            b"+++ w/file.txt",
+            b"@@ -1,2 +1,2 @@",
+            b" unchanged line",
+            b"-deleted line",
+            b"+added line",
+        ]
+        names, nametypes, insert, delete, namelen, maxdiff = _parse_patch(diff)
+        self.assertEqual(names, [b"file.txt"])
+        self.assertEqual(nametypes, [False])
+        self.assertEqual(insert, [1])
+        self.assertEqual(delete, [1])
+
+    def test_reversed_prefixes(self):
+        """Test parsing git diffs generated with git diff -R."""
+        diff = [
+            b"diff --git b/file.txt a/file.txt",
+            b"@@ -1 +1 @@",
+            b"-deleted line",
+            b"+added line",
+            b"diff --git w/other.txt i/other.txt",
+            b"@@ -1 +1 @@",
+            b"+added line",
+            b"diff --git w/third.txt c/third.txt",
+            b"@@ -1 +1 @@",
+            b"-deleted line",
+        ]
+        names, nametypes, insert, delete, namelen, maxdiff = _parse_patch(diff)
+        self.assertEqual(names, [b"file.txt", b"other.txt", b"third.txt"])
+        self.assertEqual(insert, [1, 1, 0])
+        self.assertEqual(delete, [1, 0, 1])
+
+    def test_bytearray_lines(self):
+        """Test parsing a git diff given as bytearray lines."""
+        diff = bytearray(
+            b"diff --git a/file.txt b/file.txt\n"
+            b"@@ -1,2 +1,2 @@\n"
+            b" unchanged line\n"
+            b"-deleted line\n"
+            b"+added line"
+        ).split(b"\n")
+        names, nametypes, insert, delete, namelen, maxdiff = _parse_patch(diff)
+        self.assertEqual(names, [b"file.txt"])
+        self.assertEqual(nametypes, [False])
+        self.assertEqual(insert, [1])
+        self.assertEqual(delete, [1])
 
     def test_multiple_files(self):
         """Test parsing a git diff with multiple files."""
@@ -137,12 +205,143 @@ class ParsePatchTests(unittest.TestCase):
             b"-deleted",
             b" unchanged",
         ]
-        names, nametypes, counts = _parse_patch(diff)
+        names, nametypes, insert, delete, namelen, maxdiff = _parse_patch(diff)
         self.assertEqual(names, [b"file1.txt", b"file2.txt"])
         self.assertEqual(nametypes, [False, False])
+        # 1 addition, 0 deletions for file1; 0 additions, 1 deletion for file2
+        self.assertEqual(insert, [1, 0])
+        self.assertEqual(delete, [0, 1])
+
+
+class ParsePatchBufferTests(unittest.TestCase):
+    """Tests for _parse_patch_buffer function."""
+
+    def _do_test_empty_input(self, parse_patch_buffer):
+        self.assertEqual(parse_patch_buffer(b""), ([], [], [], [], 0, 0))
+
+    test_empty_input = functest_builder(_do_test_empty_input, _parse_patch_buffer_py)
+    test_empty_input_extension = ext_functest_builder(
+        _do_test_empty_input, _parse_patch_buffer_rs
+    )
+
+    def _do_test_matches_parse_patch(self, parse_patch_buffer):
+        diff = [
+            b"diff --git a/oldname.txt b/newname.txt",
+            b"similarity index 80%",
+            b"rename from oldname.txt",
+            b"rename to newname.txt",
+            b"--- a/oldname.txt",
+            b"+++ b/newname.txt",
+            b"@@ -1,3 +1,4 @@",
+            b" unchanged line",
+            b"+added line",
+            b"@@ -10,2 +11,1 @@",
+            b"-deleted line",
+            b"",  # Empty line ends the chunk
+            b"+not counted",
+            b"diff --git a/image.png b/image.png",
+            b"Binary files a/image.png and b/image.png differ",
+            b"diff --git a/file.txt b/file.txt",
+            b"--- a/file.txt",
+            b"+++ b/file.txt",
+            b"@@ -1,2 +1,2 @@",
+            b"+++ added line that looks like a header",
+            b"--- deleted line that looks like a header",
+            b"",
+        ]
+        self.assertEqual(parse_patch_buffer(b"\n".join(diff)), _parse_patch(diff))
+        names, nametypes, insert, delete, namelen, maxdiff = parse_patch_buffer(
+            b"\n".join(diff)
+        )
+        self.assertEqual(
+            names, [(b"oldname.txt", b"newname.txt"), b"image.png", b"file.txt"]
+        )
+        self.assertEqual(nametypes, [False, True, False])
+        self.assertEqual(insert, [1, 0, 1])
+        self.assertEqual(delete, [1, 0, 1])
+        self.assertEqual((namelen, maxdiff), (26, 2))
+
+    test_matches_parse_patch = functest_builder(
+        _do_test_matches_parse_patch, _parse_patch_buffer_py
+    )
+    test_matches_parse_patch_extension = ext_functest_builder(
+        _do_test_matches_parse_patch, _parse_patch_buffer_rs
+    )
+
+    def _do_test_mnemonic_prefix(self, parse_patch_buffer):
+        diff = b"""diff --git c/a.txt i/b.txt
+rename from a.txt
+rename to b.txt
+--- c/a.txt
++++ i/b.txt
+@@ -1 +1 @@
+-deleted line
++added line
+"""
+        self.assertEqual(
+            parse_patch_buffer(diff), ([(b"a.txt", b"b.txt")], [False], [1], [1], 14, 2)
+        )
+
+    test_mnemonic_prefix = functest_builder(
+        _do_test_mnemonic_prefix, _parse_patch_buffer_py
+    )
+    test_mnemonic_prefix_extension = ext_functest_builder(
+        _do_test_mnemonic_prefix, _parse_patch_buffer_rs
+    )
+
+    def _do_test_reversed_prefixes(self, parse_patch_buffer):
+        diff = (
+            b"diff --git 2/a.txt 1/a.txt\n@@ -1 +1 @@\n+added line\n"
+            b"diff --git i/b.txt c/b.txt\n@@ -1 +1 @@\n-deleted line\n"
+        )
         self.assertEqual(
-            counts, [(1, 0), (0, 1)]
-        )  # 1 addition, 0 deletions for file1; 0 additions, 1 deletion for file2
+            parse_patch_buffer(diff),
+            ([b"a.txt", b"b.txt"], [False, False], [1, 0], [0, 1], 5, 1),
+        )
+
+    test_reversed_prefixes = functest_builder(
+        _do_test_reversed_prefixes, _parse_patch_buffer_py
+    )
+    test_reversed_prefixes_extension = ext_functest_builder(
+        _do_test_reversed_prefixes, _parse_patch_buffer_rs
+    )
+
+    def _do_test_mmap_input(self, parse_patch_buffer):
+        diff = b"diff --git a/file.txt b/file.txt\n@@ -1 +1 @@\n-old\n+new\n"
+        with mmap.mmap(-1, len(diff)) as data:
+            data.write(diff)
+            self.assertEqual(parse_patch_buffer(data), parse_patch_buffer(diff))
+
+    test_mmap_input = functest_builder(_do_test_mmap_input, _parse_patch_buffer_py)
+    test_mmap_input_extension = ext_functest_builder(
+        _do_test_mmap_input, _parse_patch_buffer_rs
+    )
+
+    def test_mmap_counted_in_windows(self):
+        """Test counting a mapped diff in windows smaller than its hunks."""
+        diff = (
+            b"diff --git a/file.txt b/file.txt\n"
+            b"@@ -1,4 +1,4 @@\n-a\n+b\n c\n-dd\n+eee\n--\n++\n"
+        )
+        expected = _parse_patch_buffer_py(diff)
+        with mmap.mmap(-1, len(diff)) as data:
+            data.write(diff)
+            for window in range(2, 12):
+                with patch.object(diffstat_module, "_MMAP_COUNT_WINDOW", window):
+                    self.assertEqual(_parse_patch_buffer_py(data), expected)
+
+    def _do_test_bytearray_input(self, parse_patch_buffer):
+        diff = b"diff --git a/file.txt b/file.txt\n@@ -1 +1 @@\n-old\n+new\n"
+        result = parse_patch_buffer(bytearray(diff))
+        self.assertEqual(result, parse_patch_buffer(diff))
+        self.assertIs(type(result[0][0]), bytes)
+
+    test_bytearray_input = functest_builder(
+        _do_test_bytearray_input, _parse_patch_buffer_py
+    )
+    test_bytearray_input_extension = ext_functest_builder(
+        _do_test_bytearray_input, _parse_patch_buffer_rs
+    )
 
 
 class DiffstatTests(unittest.TestCase):
@@ -217,6 +416,58 @@ class DiffstatTests(unittest.TestCase):
         self.assertIn(b"2 insertions(+)", result)
         self.assertIn(b"1 deletions(-)", result)
 
+    def test_buffer_input(self):
+        """Test generating a diffstat from the raw diff."""
+        diff = [
+            b"diff --git a/file.txt b/file.txt",
+            b"index 1234567..abcdefg 100644",
+            b"--- a/file.txt",
+            b"+++ b/file.txt",
+            b"@@ -1,2 +1,3 @@",
+            b" unchanged line",
+            b"+added line",
+            b" unchanged line",
+        ]
+        self.assertEqual(diffstat(b"\n".join(diff)), diffstat(diff))
+        self.assertEqual(diffstat(bytearray(b"\n".join(diff))), diffstat(diff))
+
+    def test_iterator_input(self):
+        """Test generating a diffstat from lines that are only iterated once."""
+        diff = [
+            b"diff --git a/file.txt b/file.txt",
+            b"@@ -1,2 +1,2 @@",
+            b"-removed line",
+            b"+added line",
+        ]
+        self.assertEqual(diffstat(iter(diff)), diffstat(diff))
+
+    def test_bytearray_lines(self):
+        """Test generating a diffstat from bytearray lines."""
+        diff = [
+            b"diff --git a/file.txt b/file.txt",
+            b"@@ -1,2 +1,2 @@",
+            b"-removed line",
+            b"+added line",
+        ]
+        self.assertEqual(diffstat([bytearray(line) for line in diff]), diffstat(diff))
+
+    def test_renamed_file_diffstat(self):
+        """Test generating diffstat for a renamed file."""
+        diff = [
+            b"diff --git a/oldname.txt b/newname.txt",
+            b"similarity index 80%",
+            b"rename from oldname.txt\r",
+            b"rename to newname.txt\r",
+            b"--- a/oldname.txt",
+            b"+++ b/newname.txt",
+            b"@@ -1,3 +1,4 @@",
+            b" unchanged line",
+            b"+added line",
+        ]
+        result = diffstat(diff)
+        self.assertIn(b" oldname.txt => newname.txt | 1 +\n", result)
+        self.assertEqual(diffstat(b"\n".join(diff)), result)
+
     def test_custom_width(self):
         """Test diffstat with custom width parameter."""
         diff = [
@@ -466,6 +717,21 @@ index 1234567..abcdefg 100644
             if os.path.exists(tmp_path):
                 os.unlink(tmp_path)
 
+    def test_main_with_empty_file(self):
+        """Test the main function with an empty diff file."""
+        import sys
+
+        with tempfile.NamedTemporaryFile(delete=False) as tmp:
+            tmp_path = tmp.name
+
+        orig_argv = sys.argv
+        try:
+            sys.argv = ["diffstat.py", tmp_path]
+            self.assertEqual(main(), 0)
+        finally:
+            sys.argv = orig_argv
+            os.unlink(tmp_path)
+
     def test_main_self_test_failure(self):
         """Test the main function when the self-test fails."""
         import io